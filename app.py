@@ -1,10 +1,16 @@
 import streamlit as st
-import requests
+import orjson
 import os
 import re
 import time
-from datetime import datetime
-from typing import Dict, List, Tuple
+import random
+import copy
+import functools
+import logging
+import threading
+from types import MappingProxyType
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # =============================================================================
 # CONFIGURATION AND SETUP
@@ -39,6 +45,33 @@ HF_TOKEN = get_hf_token()
 API_URL = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-medium"
 headers = {"Authorization": f"Bearer {HF_TOKEN}"} if HF_TOKEN else {}
 
+# Shared HTTP session so every message reuses the pooled TLS connection to the API.
+# Built on first use, so requests/urllib3 are never imported when no HF_TOKEN is set.
+# The adapter doesn't retry: _call_huggingface_api owns all retries, so a failing
+# call can't multiply into adapter retries inside each loop attempt.
+@functools.lru_cache(maxsize=1)
+def _get_hf_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    
+    session = requests.Session()
+    session.headers.update(headers)
+    session.headers["Content-Type"] = "application/json"  # Bodies are pre-encoded with orjson
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+    return session
+
+# Rate limiting, gateway errors and model loading are worth another attempt
+_RETRY_STATUSES = frozenset({429, 502, 503})
+_API_DEADLINE = 10.0  # Seconds a user can be kept waiting across every attempt
+_API_COOLDOWN = 60.0  # Seconds to skip the API entirely after it fails outright
+
+# DialoGPT tends to keep writing the next "User:" line itself; the reply ends there
+_TURN_BREAK_RE = re.compile(r'\n(?:User|Counselor):')
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with a little jitter, capped at 2 seconds"""
+    return min(0.25 * 2 ** attempt + random.random() * 0.1, 2.0)
+
 SYSTEM_PROMPT = """You are SafeSpace, a compassionate AI mental health supporter. Your role is to:
 - Provide empathetic, non-judgmental support
 - Use active listening techniques
@@ -48,127 +81,294 @@ SYSTEM_PROMPT = """You are SafeSpace, a compassionate AI mental health supporter
 
 Remember: You are not a replacement for professional therapy, but a supportive companion."""
 
+_SYSTEM_TURN = ("system", SYSTEM_PROMPT)
+
+# Counselor prompt and generation settings sent with every HF request
+_PROMPT_PREFIX = "You are a supportive mental health counselor. Respond with empathy and care.\nUser: "
+_PROMPT_SUFFIX = "\nCounselor:"
+_HF_PARAMS = {
+    "max_new_tokens": 120,
+    "return_full_text": False,
+    "temperature": 0.7,
+    "do_sample": True,
+    "repetition_penalty": 1.1
+}
+
 # =============================================================================
 # MENTAL HEALTH TOOLS AND AI LOGIC
 # =============================================================================
 
+# Detection vocabularies - compiled case-insensitively below, so callers can pass the raw message
+CRISIS_PATTERNS = [
+    r'\b(suicide|kill myself|end it all|want to die|not worth living)\b',
+    r'\b(harm myself|hurt myself|self harm|cut myself)\b',
+    r'\b(overdose|pills to die|end my life)\b',
+    r'\b(gun|knife|rope|bridge|jump)\b.*\b(end|die|kill)\b',
+    r'\b(no point|give up|can\'?t go on|hopeless)\b',
+    r'\b(better off dead|world without me)\b',
+    r'\b(in crisis)\b'
+]
+
+# Matched as whole words, so common inflections are listed alongside each base keyword
+EMOTION_KEYWORDS = {
+    'anxiety': ['anxious', 'worried', 'nervous', 'panic', 'fear', 'scared', 'terrified', 'petrified',
+                'anxiously', 'anxiousness', 'worriedly', 'nervously', 'nervousness', 'panics', 'panicked',
+                'panicking', 'panicky', 'fears', 'feared', 'fearing', 'fearful', 'fearfully'],
+    'depression': ['sad', 'depressed', 'hopeless', 'empty', 'worthless', 'tired', 'numb', 'hollow',
+                   'sadness', 'sadly', 'sadder', 'saddest', 'sadden', 'saddens', 'saddened', 'saddening',
+                   'hopelessness', 'hopelessly', 'worthlessness', 'tiredness', 'tiredly', 'numbness', 'numbs',
+                   'numbed', 'numbing', 'numbly', 'hollowness', 'hollowed'],
+    'anger': ['angry', 'mad', 'frustrated', 'furious', 'rage', 'irritated', 'livid', 'enraged',
+              'angrily', 'madness', 'madder', 'maddest', 'frustratedly', 'furiously', 'rages', 'raged',
+              'raging', 'outrage', 'outraged', 'outrages', 'outrageous', 'enrage', 'enrages'],
+    'stress': ['stressed', 'overwhelmed', 'pressure', 'burden', 'exhausted', 'burned out', 'swamped',
+               'distressed', 'pressures', 'pressured', 'burdens', 'burdened', 'burdening', 'burdensome'],
+    'loneliness': ['lonely', 'alone', 'isolated', 'disconnected', 'abandoned', 'forgotten', 'excluded',
+                   'disconnectedness'],
+    'grief': ['grieving', 'mourning', 'loss', 'bereaved', 'heartbroken', 'devastated', 'losses'],
+    'confusion': ['confused', 'lost', 'uncertain', 'directionless', 'unclear', 'mixed up',
+                  'confusedly', 'uncertainly', 'uncertainty', 'uncertainties']
+}
+
+COPING_STRATEGIES = {
+    'anxiety': "Try the 4-7-8 breathing technique: inhale for 4, hold for 7, exhale for 8. Use the 5-4-3-2-1 grounding method: name 5 things you see, 4 you hear, 3 you touch, 2 you smell, 1 you taste.",
+    'depression': "Small steps count. Try the 'one tiny thing' approach - do just one small positive action today. Consider sunlight exposure, gentle movement, or connecting with someone who cares about you.",
+    'anger': "Use the STOP technique: Stop what you're doing, Take a deep breath, Observe your feelings, Proceed mindfully. Try the 6-second rule - strong emotions peak and start to fade after 6 seconds.",
+    'stress': "Try the HALT check: are you Hungry, Angry, Lonely, or Tired? Address basic needs first. Use the 2-minute rule: if it takes less than 2 minutes, do it now to reduce mental load.",
+    'loneliness': "Reach out with a 'thinking of you' message to someone. Join online communities, volunteer virtually, or try co-working spaces. Remember: loneliness is temporary.",
+    'grief': "Allow yourself to feel. Grief comes in waves - that's normal. Create a small ritual to honor what you've lost. Consider grief support groups or counseling.",
+    'confusion': "Write down what you know for sure, then what you're uncertain about. Break big decisions into smaller steps. It's okay not to have all the answers right now."
+}
+
+# Compiled once at import so detection doesn't re-parse patterns on every message
+_CRISIS_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in CRISIS_PATTERNS), re.IGNORECASE)
+
+# Cheap necessary-condition test: every crisis pattern contains at least one of these
+# substrings, so messages without any of them skip the crisis regexes entirely
+_CRISIS_PREFILTER = (
+    'suicide', 'kill', 'end', 'die', 'dead', 'harm', 'hurt', 'cut myself', 'overdose',
+    'worth living', 'no point', 'give up', 'go on', 'hopeless', 'without me', 'crisis'
+)
+
+# Single-word keywords resolve through one dict lookup per message token; the few
+# multi-word keywords ("burned out", "mixed up") keep a small phrase regex
+_TOKEN_RE = re.compile(r"\w+")
+_KEYWORD_TO_EMOTION: Dict[str, str] = {
+    keyword: emotion
+    for emotion, keywords in EMOTION_KEYWORDS.items()
+    for keyword in keywords if ' ' not in keyword
+}
+_EMOTION_PHRASE_RE = re.compile(
+    '|'.join(
+        '(?P<' + emotion + r'>\b(?:' + '|'.join(re.escape(k) for k in phrases) + r')\b)'
+        for emotion, phrases in (
+            (emotion, [k for k in keywords if ' ' in k]) for emotion, keywords in EMOTION_KEYWORDS.items()
+        ) if phrases
+    )
+)
+
+def _has_crisis_language(message_lower: str) -> bool:
+    if not any(fragment in message_lower for fragment in _CRISIS_PREFILTER):
+        return False
+    return _CRISIS_RE.search(message_lower) is not None
+
+def _emotions_in(message_lower: str) -> Tuple[str, ...]:
+    tokens = set(_TOKEN_RE.findall(message_lower))
+    hits = {_KEYWORD_TO_EMOTION[token] for token in tokens & _KEYWORD_TO_EMOTION.keys()}
+    hits.update(match.lastgroup for match in _EMOTION_PHRASE_RE.finditer(message_lower) if match.lastgroup)
+    return tuple(emotion for emotion in EMOTION_KEYWORDS if emotion in hits)
+
+# Detection is memoized on the lowercased message: the quick-start prompts and common
+# phrasings repeat across reruns and sessions, and the submit callback's crisis check
+# leaves the entry the worker's scan then hits
+@functools.lru_cache(maxsize=1024)
+def _scan_message(message_lower: str) -> Tuple[bool, Tuple[str, ...]]:
+    # Crisis is settled first; a hit returns before any emotion work
+    if _has_crisis_language(message_lower):
+        return True, ()
+    return False, _emotions_in(message_lower)
+
+# At most one output per subset of emotions, so the cache saturates almost immediately
+@functools.lru_cache(maxsize=128)
+def _coping_strategies(emotions: frozenset) -> str:
+    if not emotions:
+        return "Practice self-compassion today. Treat yourself with the same kindness you'd show a good friend."
+    
+    # Join in the canonical emotion order, which the frozenset key doesn't preserve
+    return " ".join(COPING_STRATEGIES[emotion] for emotion in COPING_STRATEGIES if emotion in emotions)
+
 class MentalHealthTools:
     """Enhanced collection of mental health support tools"""
     
     @staticmethod
     def detect_crisis(message: str) -> bool:
         """Detect crisis situations that need immediate intervention"""
-        crisis_patterns = [
-            r'\b(suicide|kill myself|end it all|want to die|not worth living)\b',
-            r'\b(harm myself|hurt myself|self harm|cut myself)\b',
-            r'\b(overdose|pills to die|end my life)\b',
-            r'\b(gun|knife|rope|bridge|jump)\b.*\b(end|die|kill)\b',
-            r'\b(no point|give up|can\'?t go on|hopeless)\b',
-            r'\b(better off dead|world without me)\b'
-        ]
-        
-        message_lower = message.lower()
-        return any(re.search(pattern, message_lower) for pattern in crisis_patterns)
+        return _scan_message(message.lower())[0]
     
     @staticmethod
-    def detect_emotions(message: str) -> List[str]:
-        """Enhanced emotion detection with more nuanced patterns"""
-        emotion_keywords = {
-            'anxiety': ['anxious', 'worried', 'nervous', 'panic', 'fear', 'scared', 'terrified', 'petrified'],
-            'depression': ['sad', 'depressed', 'hopeless', 'empty', 'worthless', 'tired', 'numb', 'hollow'],
-            'anger': ['angry', 'mad', 'frustrated', 'furious', 'rage', 'irritated', 'livid', 'enraged'],
-            'stress': ['stressed', 'overwhelmed', 'pressure', 'burden', 'exhausted', 'burned out', 'swamped'],
-            'loneliness': ['lonely', 'alone', 'isolated', 'disconnected', 'abandoned', 'forgotten', 'excluded'],
-            'grief': ['grieving', 'mourning', 'loss', 'bereaved', 'heartbroken', 'devastated'],
-            'confusion': ['confused', 'lost', 'uncertain', 'directionless', 'unclear', 'mixed up']
-        }
-        
-        message_lower = message.lower()
-        detected_emotions = []
-        
-        for emotion, keywords in emotion_keywords.items():
-            if any(keyword in message_lower for keyword in keywords):
-                detected_emotions.append(emotion)
-        
-        return detected_emotions
+    def scan_message(message_lower: str) -> Tuple[bool, List[str]]:
+        """Detect crisis and emotions together in one pass over the lowercased message"""
+        is_crisis, emotions = _scan_message(message_lower)
+        return is_crisis, list(emotions)
     
     @staticmethod
     def get_coping_strategies(emotions: List[str]) -> str:
         """Enhanced coping strategies based on detected emotions"""
-        strategies = {
-            'anxiety': "Try the 4-7-8 breathing technique: inhale for 4, hold for 7, exhale for 8. Use the 5-4-3-2-1 grounding method: name 5 things you see, 4 you hear, 3 you touch, 2 you smell, 1 you taste.",
-            'depression': "Small steps count. Try the 'one tiny thing' approach - do just one small positive action today. Consider sunlight exposure, gentle movement, or connecting with someone who cares about you.",
-            'anger': "Use the STOP technique: Stop what you're doing, Take a deep breath, Observe your feelings, Proceed mindfully. Try the 6-second rule - strong emotions peak and start to fade after 6 seconds.",
-            'stress': "Try the HALT check: are you Hungry, Angry, Lonely, or Tired? Address basic needs first. Use the 2-minute rule: if it takes less than 2 minutes, do it now to reduce mental load.",
-            'loneliness': "Reach out with a 'thinking of you' message to someone. Join online communities, volunteer virtually, or try co-working spaces. Remember: loneliness is temporary.",
-            'grief': "Allow yourself to feel. Grief comes in waves - that's normal. Create a small ritual to honor what you've lost. Consider grief support groups or counseling.",
-            'confusion': "Write down what you know for sure, then what you're uncertain about. Break big decisions into smaller steps. It's okay not to have all the answers right now."
-        }
-        
-        if not emotions:
-            return "Practice self-compassion today. Treat yourself with the same kindness you'd show a good friend."
-        
-        selected_strategies = [strategies.get(emotion, "") for emotion in emotions if emotion in strategies]
-        return " ".join(filter(None, selected_strategies))
+        return _coping_strategies(frozenset(emotions))
+
+# Canned replies are built once and shared read-only across every call and session
+_CRISIS_RESPONSE = MappingProxyType({
+    'response': """🆘 **I'm very concerned about what you're sharing. Your life has value and there are people who want to help.**
+
+**🇮🇳 Immediate Support in India:**
+• **Call 9152987821** - AASRA Suicide Prevention (24/7)
+• **Call 1860-266-2345** - Vandrevala Foundation (24/7, free)
+• **Call 1800-599-0019** - Kiran Mental Health Helpline
+• **WhatsApp +91 9820466726** - Connecting NGO
+
+**🌍 International:**
+• **Call 988** - US Suicide & Crisis Lifeline
+• **Text HELLO to 741741** - Crisis Text Line
+
+🌟 **You are not alone.** Professional counselors are available right now to talk with you.
+
+Would you like to talk about what's bringing up these feelings? I'm here to listen without judgment.""",
+    'tool': 'crisis_intervention'
+})
+
+_FALLBACK_RESPONSE = MappingProxyType({
+    'response': "I'm here to listen and support you. Even when technology has hiccups, my commitment to being here for you remains constant. How are you feeling right now? What's on your mind?",
+    'tool': 'technical_fallback'
+})
+
+_GREETING_RESPONSE = MappingProxyType({
+    'response': "Hello and welcome to SafeSpace! 🌟 I'm here to listen without judgment and support you through whatever you're experiencing. How are you feeling today? Take your time - there's no pressure to share more than you're comfortable with.",
+    'tool': 'warm_greeting'
+})
+
+_GRATITUDE_RESPONSE = MappingProxyType({
+    'response': "You're so welcome. 💛 It takes real courage to reach out and talk about these things. I'm honored that you chose to share with me. Remember, seeking support is a sign of strength, not weakness. How else can I support you today?",
+    'tool': 'gratitude_response'
+})
+
+_CHECKIN_RESPONSE = MappingProxyType({
+    'response': "Thank you for asking! As an AI, I don't have feelings, but I'm here and fully focused on you. What matters most right now is how *you* are doing. I'm ready to listen to whatever you'd like to share.",
+    'tool': 'check_in_redirect'
+})
+
+# Emotion-specific replies, fully formatted at import and checked in priority order
+_EMOTION_RESPONSES: Dict[str, Mapping[str, str]] = {
+    emotion: MappingProxyType({
+        'response': f"{response}\n\n{heading} {MentalHealthTools.get_coping_strategies([emotion])}",
+        'tool': tool
+    })
+    for emotion, response, heading, tool in (
+        ('anxiety',
+         "I can hear the anxiety in your words, and I want you to know that what you're feeling is real and valid. Anxiety can feel overwhelming, but you're not alone in this experience.",
+         "🫁 **Try this breathing technique:**", 'anxiety_support'),
+        ('depression',
+         "I hear the pain in your words, and I want you to know that your feelings are completely valid. Depression can make everything feel heavy and difficult, but please know that you matter and you're not alone.",
+         "💙 **Gentle reminder:**", 'depression_support'),
+        ('stress',
+         "It sounds like you're carrying a heavy load right now. Feeling stressed and overwhelmed is exhausting, and it takes real strength to reach out for support.",
+         "🌱 **Stress relief technique:**", 'stress_management'),
+        ('loneliness',
+         "Loneliness can feel so painful and isolating. I want you to know that reaching out here shows incredible courage, and you're taking a step toward connection right now.",
+         "🤝 **Connection idea:**", 'loneliness_support'),
+    )
+}
+
+# Rule-based triggers, one named group per reply bucket. Words match whole words;
+# the check-in phrases match as plain substrings
+_DISPATCH_TRIGGERS = (
+    ('greeting', r'\b(?:hello|hi|hey|start|beginning|good (?:morning|afternoon|evening))\b'),
+    ('thanks', r'\b(?:thank|thanks|thankyou|thanking|thanked|thankful|thankfully|grateful|gratefully|'
+               r'appreciate|appreciates|appreciated|appreciating)\b'),
+    ('checkin', r'how are you|are you okay|how do you feel'),
+    ('anxiety', r'\b(?:anxious|worried|panic|scared)\b'),
+    ('depression', r'\b(?:sad|depressed|hopeless|empty|worthless)\b'),
+    ('stress', r'\b(?:stressed|overwhelmed|pressure|burned|exhausted)\b'),
+    ('loneliness', r'\b(?:lonely|alone|isolated|disconnected)\b'),
+)
+
+# One scan of the message reports every bucket it triggers
+_DISPATCH_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in _DISPATCH_TRIGGERS))
+
+# Replies depend only on the lowercased message and its detected emotions, so
+# repeated small talk ("hi", "thanks") is answered straight from the cache
+@functools.lru_cache(maxsize=256)
+def _rule_based_reply(message_lower: str, emotions: Tuple[str, ...]) -> Mapping[str, str]:
+    hits = {match.lastgroup for match in _DISPATCH_RE.finditer(message_lower)}
+    
+    # Enhanced greeting responses
+    if 'greeting' in hits:
+        return _GREETING_RESPONSE
+    
+    # Enhanced emotion-specific responses, from trigger words or detected emotions
+    triggered = hits.union(emotions)
+    for category, reply in _EMOTION_RESPONSES.items():
+        if category in triggered:
+            return reply
+    
+    # Thanks/gratitude with encouragement
+    if 'thanks' in hits:
+        return _GRATITUDE_RESPONSE
+    
+    # Enhanced check-in responses
+    if 'checkin' in hits:
+        return _CHECKIN_RESPONSE
+    
+    # Enhanced default empathetic response with emotion acknowledgment
+    emotion_acknowledgment = ""
+    if emotions:
+        emotion_list = ", ".join(emotions)
+        emotion_acknowledgment = f"I can sense you might be feeling {emotion_list}, and I want you to know those feelings are completely valid. "
+    
+    return MappingProxyType({
+        'response': f"{emotion_acknowledgment}I'm here to listen and support you through whatever you're experiencing. Sometimes it helps to talk through what's on your mind. What would you like to share with me? Remember, you can share as much or as little as feels comfortable.",
+        'tool': 'empathetic_listening'
+    })
 
 class EnhancedGraph:
     """Enhanced AI conversation handler with better error handling"""
     
+    _hf_cooldown_until: float = 0.0  # time.monotonic() before which the API is considered down
+    
     def __init__(self):
         self.tools = MentalHealthTools()
-        self.conversation_history = []
         self.api_available = bool(HF_TOKEN)
     
-    def stream(self, inputs, stream_mode):
+    def respond(self, inputs, on_text: Optional[Callable[[str], None]] = None) -> Mapping[str, str]:
         """Main conversation processing with enhanced error handling"""
         try:
             user_message = inputs["messages"][1][1]  # Get user message
-            self.conversation_history.append(("user", user_message))
+            message_lower = user_message.lower()  # Lowercased once for every matcher below
             
-            # Crisis detection with immediate response
-            if self.tools.detect_crisis(user_message):
-                crisis_response = self._handle_crisis()
-                yield crisis_response
-                return
+            # Crisis and emotion detection share a single scan of the message
+            is_crisis, emotions = self.tools.scan_message(message_lower)
             
-            # Detect emotional state
-            emotions = self.tools.detect_emotions(user_message)
+            # Crisis detection with immediate response
+            if is_crisis:
+                return self._handle_crisis()
             
             # Generate empathetic response
-            response_data = self._generate_response(user_message, emotions)
-            yield response_data
+            return self._generate_response(user_message, message_lower, emotions, on_text)
             
         except Exception as e:
             st.error(f"Processing error: {e}")
-            yield self._fallback_response()
+            return self._fallback_response()
     
-    def _handle_crisis(self) -> Dict[str, str]:
+    def _handle_crisis(self) -> Mapping[str, str]:
         """Enhanced crisis intervention with local resources"""
-        return {
-            'response': """🆘 **I'm very concerned about what you're sharing. Your life has value and there are people who want to help.**
-
-**🇮🇳 Immediate Support in India:**
-• **Call 9152987821** - AASRA Suicide Prevention (24/7)
-• **Call 1860-266-2345** - Vandrevala Foundation (24/7, free)
-• **Call 1800-599-0019** - Kiran Mental Health Helpline
-• **WhatsApp +91 9820466726** - Connecting NGO
-
-**🌍 International:**
-• **Call 988** - US Suicide & Crisis Lifeline
-• **Text HELLO to 741741** - Crisis Text Line
-
-🌟 **You are not alone.** Professional counselors are available right now to talk with you.
-
-Would you like to talk about what's bringing up these feelings? I'm here to listen without judgment.""",
-            'tool': 'crisis_intervention'
-        }
+        return _CRISIS_RESPONSE
     
-    def _generate_response(self, user_message: str, emotions: List[str]) -> Dict[str, str]:
+    def _generate_response(self, user_message: str, message_lower: str, emotions: List[str],
+                           on_text: Optional[Callable[[str], None]] = None) -> Mapping[str, str]:
         """Enhanced response generation with better fallbacks"""
         
         # Try AI response first (if token available)
         if self.api_available:
-            ai_response = self._call_huggingface_api(user_message)
+            ai_response = self._call_huggingface_api(user_message, on_text=on_text)
             if ai_response:
                 # Enhance AI response with emotional support
                 enhanced_response = self._enhance_response(ai_response, emotions)
@@ -178,64 +378,107 @@ Would you like to talk about what's bringing up these feelings? I'm here to list
                 }
         
         # Fallback to enhanced rule-based response
-        return self._rule_based_response(user_message, emotions)
+        return self._rule_based_response(message_lower, emotions)
     
-    def _call_huggingface_api(self, message: str, retries: int = 2) -> str:
+    def _call_huggingface_api(self, message: str, retries: int = 2,
+                              on_text: Optional[Callable[[str], None]] = None) -> str:
         """Enhanced API call with retry logic and better error handling"""
         if not HF_TOKEN:
             return ""
-            
+        
+        # Circuit breaker: while the endpoint is known to be down, don't pay the timeouts again
+        if time.monotonic() < self._hf_cooldown_until:
+            return ""
+        
+        import requests  # Deferred until a token is set, like _get_hf_session
+        
+        # Create a more therapeutic prompt
+        prompt = _PROMPT_PREFIX + message + _PROMPT_SUFFIX
+        
+        # Serialized once up front; every retry sends the same bytes. Asking for a token
+        # stream lets the body be read as it's generated instead of all at the end.
+        payload = orjson.dumps({
+            "inputs": prompt,
+            "parameters": _HF_PARAMS,
+            "stream": True
+        })
+        
+        deadline = time.monotonic() + _API_DEADLINE
+        service_down = False
+        
         for attempt in range(retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
             try:
-                # Create a more therapeutic prompt
-                prompt = f"You are a supportive mental health counselor. Respond with empathy and care.\nUser: {message}\nCounselor:"
-                
-                response = requests.post(
+                with _get_hf_session().post(
                     API_URL, 
-                    headers=headers, 
-                    json={
-                        "inputs": prompt,
-                        "parameters": {
-                            "max_new_tokens": 120,
-                            "return_full_text": False,
-                            "temperature": 0.7,
-                            "do_sample": True,
-                            "repetition_penalty": 1.1
-                        }
-                    },
-                    timeout=15
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if isinstance(result, list) and len(result) > 0:
-                        generated_text = result[0].get('generated_text', '').strip()
-                        # Clean up the response
-                        generated_text = generated_text.replace(prompt, '').strip()
+                    data=payload,
+                    stream=True,
+                    timeout=remaining
+                ) as response:
+                    service_down = response.status_code != 200
+                    if response.status_code == 200:
+                        generated_text = ""
+                        for text in self._iter_generated_text(response, prompt):
+                            generated_text += text
+                            turn_break = _TURN_BREAK_RE.search(generated_text)
+                            if turn_break:
+                                # Leaving the with-block closes the stream and stops the download
+                                generated_text = generated_text[:turn_break.start()]
+                                break
+                            if on_text is not None:
+                                on_text(generated_text)
+                            if time.monotonic() >= deadline:
+                                # The read timeout only bounds each gap; a trickling stream
+                                # is cut here and whatever arrived so far is kept
+                                break
+                        generated_text = generated_text.strip()
                         if generated_text and len(generated_text) > 10:  # Ensure meaningful response
                             return generated_text
                             
-                elif response.status_code == 503:  # Model loading
-                    if attempt < retries:
-                        time.sleep(3)  # Wait for model to load
-                        continue
-                else:
-                    st.warning(f"API responded with status {response.status_code}. Using fallback response.")
-                    break
+                    elif response.status_code not in _RETRY_STATUSES:
+                        st.warning(f"API responded with status {response.status_code}. Using fallback response.")
+                        break
                     
             except requests.exceptions.Timeout:
-                if attempt < retries:
-                    time.sleep(1)
-                    continue
+                service_down = True
             except Exception as e:
-                if attempt < retries:
-                    time.sleep(1)
-                    continue
-                else:
+                service_down = True
+                if attempt == retries:
                     st.warning("AI service temporarily unavailable. Using trained fallback responses.")
+            
+            # Only wait if another attempt can still start before the deadline
+            delay = _backoff_delay(attempt)
+            if attempt < retries and time.monotonic() + delay < deadline:
+                time.sleep(delay)
+            else:
+                break
+        
+        if service_down:
+            self._hf_cooldown_until = time.monotonic() + _API_COOLDOWN
         
         return ""
     
+    @staticmethod
+    def _iter_generated_text(response, prompt: str) -> Iterator[str]:
+        """Yield generated text as it arrives, from a token stream or a plain JSON reply"""
+        if response.headers.get("Content-Type", "").startswith("text/event-stream"):
+            # Server-sent events: each "data:" line carries one generated token
+            for line in response.iter_lines(chunk_size=None):  # Hand over each chunk as it arrives
+                if not line.startswith(b"data:"):
+                    continue
+                token = orjson.loads(line[len(b"data:"):]).get("token") or {}
+                if not token.get("special"):
+                    yield token.get("text", "")
+        else:
+            # Models without streaming support answer with the full JSON result
+            result = orjson.loads(response.content)
+            if isinstance(result, list) and len(result) > 0:
+                # Clean up the response
+                yield result[0].get('generated_text', '').replace(prompt, '')
+    
     def _enhance_response(self, base_response: str, emotions: List[str]) -> str:
         """Enhanced response enhancement with better formatting"""
         if not emotions:
@@ -249,82 +492,13 @@ Would you like to talk about what's bringing up these feelings? I'm here to list
         
         return base_response
     
-    def _rule_based_response(self, message: str, emotions: List[str]) -> Dict[str, str]:
+    def _rule_based_response(self, message_lower: str, emotions: List[str]) -> Mapping[str, str]:
         """Enhanced rule-based therapeutic responses"""
-        message_lower = message.lower()
-        
-        # Enhanced greeting responses
-        greetings = ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening', 'start', 'beginning']
-        if any(greeting in message_lower for greeting in greetings):
-            return {
-                'response': "Hello and welcome to SafeSpace! 🌟 I'm here to listen without judgment and support you through whatever you're experiencing. How are you feeling today? Take your time - there's no pressure to share more than you're comfortable with.",
-                'tool': 'warm_greeting'
-            }
-        
-        # Enhanced emotion-specific responses
-        if 'anxiety' in emotions or any(word in message_lower for word in ['anxious', 'worried', 'panic', 'scared']):
-            response = "I can hear the anxiety in your words, and I want you to know that what you're feeling is real and valid. Anxiety can feel overwhelming, but you're not alone in this experience."
-            coping = self.tools.get_coping_strategies(['anxiety'])
-            return {
-                'response': f"{response}\n\n🫁 **Try this breathing technique:** {coping}",
-                'tool': 'anxiety_support'
-            }
-        
-        elif 'depression' in emotions or any(word in message_lower for word in ['sad', 'depressed', 'hopeless', 'empty', 'worthless']):
-            response = "I hear the pain in your words, and I want you to know that your feelings are completely valid. Depression can make everything feel heavy and difficult, but please know that you matter and you're not alone."
-            coping = self.tools.get_coping_strategies(['depression'])
-            return {
-                'response': f"{response}\n\n💙 **Gentle reminder:** {coping}",
-                'tool': 'depression_support'
-            }
-        
-        elif 'stress' in emotions or any(word in message_lower for word in ['stressed', 'overwhelmed', 'pressure', 'burned', 'exhausted']):
-            response = "It sounds like you're carrying a heavy load right now. Feeling stressed and overwhelmed is exhausting, and it takes real strength to reach out for support."
-            coping = self.tools.get_coping_strategies(['stress'])
-            return {
-                'response': f"{response}\n\n🌱 **Stress relief technique:** {coping}",
-                'tool': 'stress_management'
-            }
-        
-        elif 'loneliness' in emotions or any(word in message_lower for word in ['lonely', 'alone', 'isolated', 'disconnected']):
-            response = "Loneliness can feel so painful and isolating. I want you to know that reaching out here shows incredible courage, and you're taking a step toward connection right now."
-            coping = self.tools.get_coping_strategies(['loneliness'])
-            return {
-                'response': f"{response}\n\n🤝 **Connection idea:** {coping}",
-                'tool': 'loneliness_support'
-            }
-        
-        # Thanks/gratitude with encouragement
-        if any(word in message_lower for word in ['thank', 'thanks', 'grateful', 'appreciate']):
-            return {
-                'response': "You're so welcome. 💛 It takes real courage to reach out and talk about these things. I'm honored that you chose to share with me. Remember, seeking support is a sign of strength, not weakness. How else can I support you today?",
-                'tool': 'gratitude_response'
-            }
-        
-        # Enhanced check-in responses
-        if any(phrase in message_lower for phrase in ['how are you', 'are you okay', 'how do you feel']):
-            return {
-                'response': "Thank you for asking! As an AI, I don't have feelings, but I'm here and fully focused on you. What matters most right now is how *you* are doing. I'm ready to listen to whatever you'd like to share.",
-                'tool': 'check_in_redirect'
-            }
-        
-        # Enhanced default empathetic response with emotion acknowledgment
-        emotion_acknowledgment = ""
-        if emotions:
-            emotion_list = ", ".join(emotions)
-            emotion_acknowledgment = f"I can sense you might be feeling {emotion_list}, and I want you to know those feelings are completely valid. "
-        
-        return {
-            'response': f"{emotion_acknowledgment}I'm here to listen and support you through whatever you're experiencing. Sometimes it helps to talk through what's on your mind. What would you like to share with me? Remember, you can share as much or as little as feels comfortable.",
-            'tool': 'empathetic_listening'
-        }
+        return _rule_based_reply(message_lower, tuple(emotions))
     
-    def _fallback_response(self) -> Dict[str, str]:
+    def _fallback_response(self) -> Mapping[str, str]:
         """Enhanced fallback response"""
-        return {
-            'response': "I'm here to listen and support you. Even when technology has hiccups, my commitment to being here for you remains constant. How are you feeling right now? What's on your mind?",
-            'tool': 'technical_fallback'
-        }
+        return _FALLBACK_RESPONSE
 
 # =============================================================================
 # UTILITY FUNCTIONS
@@ -339,36 +513,189 @@ def validate_api_setup():
         st.sidebar.success("🤖 **Enhanced AI Mode Active**")
     return True
 
-def parse_response(stream):
-    """Enhanced response parsing with better error handling"""
-    try:
-        result = next(stream)
-        return result['tool'], result['response']
-    except StopIteration:
-        return 'error', "I'm having trouble processing that right now, but I'm still here to listen and support you."
-    except Exception as e:
-        st.error(f"Parse error: {e}")
-        return 'error', "I want to help you, but I'm experiencing some technical difficulties. Your feelings and experiences are still important to me. Can you tell me how you're feeling?"
+# Cached so reruns and new sessions reuse the same graph, along with the pooled HF
+# session, detection caches and the API cooldown it carries
+@st.cache_resource(show_spinner=False)
+def get_graph() -> EnhancedGraph:
+    """Build the shared conversation graph"""
+    graph = EnhancedGraph()
+    if graph.api_available:
+        # Import requests and build the pooled session off the script thread, so
+        # neither the first paint nor the first message waits for it
+        threading.Thread(target=_get_hf_session, daemon=True).start()
+    return graph
+
+class _UncachedReply(Exception):
+    """Carries a non-AI reply out of a cached function; st.cache_data stores nothing for calls that raise"""
+    
+    def __init__(self, result: Mapping[str, str]):
+        super().__init__(result['tool'])
+        self.result = result
+
+def _ai_reply(user_message: str, on_text: Optional[Callable[[str], None]]) -> Tuple[str, str]:
+    """Run the graph, letting only successful AI replies be cached by the caller"""
+    inputs = {"messages": [_SYSTEM_TURN, ("user", user_message)]}
+    result = graph.respond(inputs, on_text=on_text)
+    # Rule-based replies are already lru-cached and cheap; pinning one here would also
+    # keep serving it after a transient API failure or cooldown has passed
+    if result['tool'] != 'ai_therapy_conversation':
+        raise _UncachedReply(result)
+    return result['response'], result['tool']
+
+# Only AI replies land in these caches. _on_text is left out of the cache key (leading
+# underscore); on a miss it receives the AI reply as it streams in
+@st.cache_data(ttl=300, max_entries=256, show_spinner=False)
+def _cached_ai_reply(user_message, _on_text=None):
+    return _ai_reply(user_message, _on_text)
+
+# The quick-start prompts are fixed, so their replies are kept far longer than typed ones
+@st.cache_data(ttl=3600, max_entries=16, show_spinner=False)
+def _cached_quick_start_reply(prompt, _on_text=None):
+    return _ai_reply(prompt, _on_text)
+
+_FALLBACK_REPLY = (
+    "I'm experiencing some technical difficulties, but I want you to know that I'm still here to support you. Your feelings and experiences matter. Can you tell me more about what's on your mind today?",
+    "fallback",
+    "error"
+)
 
-def get_ai_response(user_message):
-    """Enhanced AI response function with better error handling"""
+def _reply_via(cached_reply, user_message: str, on_text: Optional[Callable[[str], None]]) -> Tuple[str, str, str]:
     try:
-        inputs = {"messages": [("system", SYSTEM_PROMPT), ("user", user_message)]}
-        stream = graph.stream(inputs, stream_mode="updates")
-        tool_called_name, final_response = parse_response(stream)
-        return final_response, tool_called_name, "success"
+        response, tool = cached_reply(user_message, on_text)
+        return response, tool, "success"
+    except _UncachedReply as uncached:
+        return uncached.result['response'], uncached.result['tool'], "success"
     except Exception as e:
         st.error(f"AI Response Error: {e}")
         # Provide a thoughtful fallback response
-        fallback = "I'm experiencing some technical difficulties, but I want you to know that I'm still here to support you. Your feelings and experiences matter. Can you tell me more about what's on your mind today?"
-        return fallback, "fallback", "error"
+        return _FALLBACK_REPLY
+
+def get_ai_response(user_message, on_text=None):
+    """Enhanced AI response function with better error handling"""
+    return _reply_via(_cached_ai_reply, user_message, on_text)
+
+def get_quick_start_response(prompt, on_text=None):
+    """Reply for one of the canned quick-start prompts"""
+    return _reply_via(_cached_quick_start_reply, prompt, on_text)
+
+def render_chat_message(msg: Dict):
+    """Render one chat history entry"""
+    with st.chat_message(msg["role"]):
+        # Special handling for crisis messages
+        if msg["role"] == "assistant" and msg.get("tool") == "crisis_intervention":
+            st.error(msg["content"])
+        else:
+            st.markdown(msg["content"])
+        
+        # Enhanced timestamp and status for assistant messages
+        if msg.get("caption"):
+            st.caption(msg["caption"])
+
+# Caption badge per reply status; anything else (quick actions, pending) shows the default
+_STATUS_EMOJI: Dict[Optional[str], str] = {"success": "✅"}
+_DEFAULT_STATUS_EMOJI = "🔄"
+
+def make_assistant_message(content: str, tool: str, status: Optional[str] = None) -> Dict:
+    """Build an assistant history entry, formatting its caption once up front"""
+    timestamp = time.strftime("%H:%M")  # Local wall-clock time, no datetime object needed
+    status_emoji = _STATUS_EMOJI.get(status, _DEFAULT_STATUS_EMOJI)
+    return {
+        "role": "assistant",
+        "content": content,
+        "tool": tool,
+        "timestamp": timestamp,
+        "status": status,
+        # Rendered on every rerun, so it's built here rather than in the history loop
+        "caption": f"{status_emoji} Responded at {timestamp} • Tool: {tool}"
+    }
+
+def add_quick_action_reply(container, content: str, tool: str):
+    """Append a canned assistant reply and render it in place, without a full rerun"""
+    msg = make_assistant_message(content, tool)
+    st.session_state.chat_history.append(msg)
+    with container:
+        render_chat_message(msg)
+
+# Well past the API deadline, so only a stuck worker ever hits it
+_RESPONSE_JOB_TIMEOUT = _API_DEADLINE + 20.0
+
+def start_response_job(user_message: str) -> Dict:
+    """Generate the reply on a worker thread so the page stays interactive meanwhile"""
+    job = {"message": user_message, "partial": "", "result": None, "started": time.monotonic()}
+    respond = get_quick_start_response if user_message in QUICK_START_PROMPTS else get_ai_response
+    
+    def _show_partial(text: str):
+        job["partial"] = text
+    
+    def _run():
+        # A job without a result would leave the bubble polling forever
+        try:
+            job["result"] = respond(user_message, _show_partial)
+        except Exception:
+            logging.exception("Response worker failed")
+            job["result"] = _FALLBACK_REPLY
+    
+    worker = threading.Thread(target=_run, daemon=True)
+    # Lets cached calls and warnings reach this session. The context is copied so the
+    # worker's cache-miss bookkeeping doesn't flag widgets the script draws meanwhile
+    add_script_run_ctx(worker, copy.copy(get_script_run_ctx()))
+    worker.start()
+    return job
+
+def submit_user_message(message: str):
+    """Record a user turn and start its reply; runs as a widget callback, before the script body"""
+    st.session_state.chat_history.append({"role": "user", "content": message})
+    st.session_state.user_msg_count += 1
+    
+    if MentalHealthTools.detect_crisis(message):
+        # The crisis reply is fixed, so it's answered right here rather than via the worker
+        st.session_state.chat_history.append(
+            make_assistant_message(_CRISIS_RESPONSE['response'], _CRISIS_RESPONSE['tool'], "success")
+        )
+        return
+    
+    # The reply is rendered by render_pending_response once the worker finishes
+    st.session_state.pending_response = start_response_job(message)
+
+def submit_chat_input():
+    """on_submit callback for the chat box"""
+    if st.session_state.chat_input:
+        submit_user_message(st.session_state.chat_input)
+
+def reset_conversation():
+    """Fresh Start callback: clear the conversation before the page is drawn again"""
+    st.session_state.chat_history = []
+    st.session_state.user_msg_count = 0
+    st.session_state.pending_response = None
+    st.toast("Conversation cleared. You can start fresh anytime you need to.")
+
+@st.fragment(run_every=0.3)
+def render_pending_response():
+    """Poll the background job, re-running only this bubble until the reply is ready"""
+    job = st.session_state.pending_response
+    if job["result"] is None and time.monotonic() - job["started"] > _RESPONSE_JOB_TIMEOUT:
+        job["result"] = _FALLBACK_REPLY  # Backstop should the worker hang or die silently
+    if job["result"] is None:
+        with st.chat_message("assistant"):
+            if job["partial"]:
+                st.markdown(job["partial"] + " ▌")  # Streamed AI text so far
+            else:
+                st.markdown("💭 *Thinking carefully about your message and preparing a thoughtful response...*")
+        return
+    
+    # Crisis messages never get here; submit_user_message answers them directly
+    response_content, tool_used, status = job["result"]
+    st.session_state.chat_history.append(make_assistant_message(response_content, tool_used, status))
+    st.session_state.pending_response = None
+    
+    # A full run is needed here: it re-enables the chat box and draws the reply from history
+    st.rerun()
 
 # =============================================================================
-# STREAMLIT FRONTEND
+# STATIC CONTENT
 # =============================================================================
 
-# Enhanced CSS for better visual experience
-st.markdown("""
+APP_CSS = """
 <style>
     .stAlert > div {
         background-color: rgba(28, 131, 225, 0.1);
@@ -392,238 +719,124 @@ st.markdown("""
         box-shadow: 0 4px 8px rgba(0,0,0,0.1);
     }
 </style>
-""", unsafe_allow_html=True)
-
-# Global graph instance
-graph = EnhancedGraph()
-
-# Validate API setup on startup
-api_available = validate_api_setup()
-
-# Enhanced header
-st.title("🧠 SafeSpace — AI Mental Health Support")
-st.markdown("### *A safe, confidential space to express your feelings and find support*")
-
-# Removed the main page Safe Mode info message
-
-# Enhanced sidebar with more comprehensive resources
-with st.sidebar:
-    st.markdown("### 🆘 Crisis Resources")
-    
-    # Indian resources first
-    st.markdown("""
-    **🇮🇳 India - Immediate Help:**
-    - **AASRA**: 9152987821 (24/7)
-    - **Vandrevala Foundation**: 1860-266-2345 (24/7, free)
-    - **Kiran Helpline**: 1800-599-0019
-    - **Connecting NGO**: WhatsApp +91 9820466726
-    
-    **🌍 International:**
-    - **US**: 988 (Suicide & Crisis Lifeline)
-    - **UK**: 116 123 (Samaritans)
-    - **Crisis Text Line**: Text HOME to 741741
-    """)
-    
-    st.markdown("---")
-    st.markdown("### 💡 Quick Coping Tools")
-    st.markdown("""
-    **🫁 Breathing:**
-    - 4-7-8 technique: In for 4, hold for 7, out for 8
-    - Box breathing: 4-4-4-4 pattern
-    
-    **🧘 Grounding (5-4-3-2-1):**
-    - 5 things you can see
-    - 4 things you can hear
-    - 3 things you can touch
-    - 2 things you can smell
-    - 1 thing you can taste
-    
-    **🚶 Movement:**
-    - Take a 5-minute walk
-    - Gentle stretching
-    - Dance to one song
-    """)
-    
-    st.markdown("---")
-    st.markdown("### 📱 Helpful Apps")
-    st.markdown("""
-    - **Headspace** - Meditation & mindfulness
-    - **Calm** - Sleep stories & relaxation
-    - **Insight Timer** - Free meditation
-    - **Youper** - Mood tracking
-    - **Sanvelo** - Anxiety & mood support
-    """)
-    
-    st.markdown("---")
-    st.markdown("### ℹ️ About SafeSpace")
-    st.markdown("""
-    SafeSpace provides:
-    - 24/7 emotional support
-    - Crisis detection & resources
-    - Coping strategy suggestions
-    - Non-judgmental listening
-    - Connection to professional help
-    
-    **Important**: This tool complements but doesn't replace professional mental health care.
-    """)
-
-# Initialize enhanced session state
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-
-if "conversation_started" not in st.session_state:
-    st.session_state.conversation_started = False
-
-if "user_name" not in st.session_state:
-    st.session_state.user_name = ""
-
-# Enhanced welcome message
-if not st.session_state.conversation_started and not st.session_state.chat_history:
-    st.success("""
-    🌟 **Welcome to SafeSpace**
-    
-    This is your safe, confidential space to express thoughts and feelings. I'm here to listen 
-    without judgment and provide support whenever you need it.
-    
-    **You can:**
-    - Share what's on your mind
-    - Talk about your feelings
-    - Get coping strategies
-    - Access mental health resources
-    
-    **Remember:** If you're in crisis, please use the emergency resources in the sidebar immediately.
-    """)
+"""
+
+FOOTER_LEFT_MARKDOWN = """
+**🔒 Privacy & Confidentiality:**
+• Your conversations are processed locally
+• No personal information is stored permanently
+• Messages are not logged or saved after sessions
+• This is a safe space for open communication
+
+---
+
+**🤖 Technical Status:**
+• AI Mode: {ai_mode}
+• Response Quality: {response_quality}
+• Crisis Detection: ✅ Active
+• Emotion Recognition: ✅ Active
+"""
+
+FOOTER_RIGHT_MARKDOWN = """
+**⚠️ Important Disclaimers:**
+• SafeSpace is an AI support tool, not a medical device
+• This is not a substitute for professional mental health treatment
+• In crisis situations, please contact emergency services immediately
+• Consider professional therapy for ongoing support
+
+---
+
+**💡 How to Get Help:**
+• Use the quick-start buttons above
+• Type your thoughts in the chat box
+• Access resources from the sidebar
+• Contact professionals for ongoing support
+"""
+
+# Quick-start buttons: (label, tooltip, prompt sent as the user's first message)
+QUICK_START_OPTIONS = (
+    ("😰 Anxious", "I'm feeling anxious or worried",
+     "I'm feeling really anxious and worried about everything. My mind won't stop racing."),
+    ("😔 Sad", "I'm feeling down or depressed",
+     "I'm feeling really sad and down lately. Everything feels heavy and difficult."),
+    ("😤 Stressed", "I'm feeling overwhelmed",
+     "I'm feeling completely overwhelmed and stressed out. There's so much pressure."),
+    ("😞 Lonely", "I'm feeling isolated",
+     "I'm feeling really lonely and disconnected from everyone around me."),
+    ("😡 Angry", "I'm feeling frustrated or angry",
+     "I'm feeling really angry and frustrated. I can't seem to control these feelings."),
+    ("😕 Confused", "I'm feeling lost or uncertain",
+     "I'm feeling confused and lost. I don't know what to do or which direction to go."),
+    ("💔 Grieving", "I'm dealing with loss",
+     "I'm grieving and dealing with a significant loss. The pain feels unbearable."),
+    ("🆘 Crisis", "I need immediate support",
+     "I'm in crisis and need immediate support. I don't know how to cope."),
+)
+QUICK_START_PROMPTS = frozenset(prompt for _, _, prompt in QUICK_START_OPTIONS)
 
-# Enhanced quick start section
-if not st.session_state.chat_history:
-    st.markdown("### 💭 How are you feeling today?")
-    st.markdown("*Choose a button below to get started, or type your own message*")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    quick_start_pressed = False
-    
-    with col1:
-        if st.button("😰 Anxious", help="I'm feeling anxious or worried"):
-            user_input = "I'm feeling really anxious and worried about everything. My mind won't stop racing."
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
-            quick_start_pressed = True
-    
-    with col2:
-        if st.button("😔 Sad", help="I'm feeling down or depressed"):
-            user_input = "I'm feeling really sad and down lately. Everything feels heavy and difficult."
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
-            quick_start_pressed = True
-    
-    with col3:
-        if st.button("😤 Stressed", help="I'm feeling overwhelmed"):
-            user_input = "I'm feeling completely overwhelmed and stressed out. There's so much pressure."
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
-            quick_start_pressed = True
-    
-    with col4:
-        if st.button("😞 Lonely", help="I'm feeling isolated"):
-            user_input = "I'm feeling really lonely and disconnected from everyone around me."
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
-            quick_start_pressed = True
-    
-    # Additional quick start options
-    st.markdown("---")
-    col5, col6, col7, col8 = st.columns(4)
-    
-    with col5:
-        if st.button("😡 Angry", help="I'm feeling frustrated or angry"):
-            user_input = "I'm feeling really angry and frustrated. I can't seem to control these feelings."
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
-            quick_start_pressed = True
-    
-    with col6:
-        if st.button("😕 Confused", help="I'm feeling lost or uncertain"):
-            user_input = "I'm feeling confused and lost. I don't know what to do or which direction to go."
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
-            quick_start_pressed = True
-    
-    with col7:
-        if st.button("💔 Grieving", help="I'm dealing with loss"):
-            user_input = "I'm grieving and dealing with a significant loss. The pain feels unbearable."
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
-            quick_start_pressed = True
-    
-    with col8:
-        if st.button("🆘 Crisis", help="I need immediate support"):
-            user_input = "I'm in crisis and need immediate support. I don't know how to cope."
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
-            quick_start_pressed = True
-    
-    if quick_start_pressed:
-        st.session_state.conversation_started = True
-        st.rerun()
+# Sidebar and quick-action copy, built once at import rather than inside the script body
+SIDEBAR_CRISIS_RESOURCES = """
+**🇮🇳 India - Immediate Help:**
+- **AASRA**: 9152987821 (24/7)
+- **Vandrevala Foundation**: 1860-266-2345 (24/7, free)
+- **Kiran Helpline**: 1800-599-0019
+- **Connecting NGO**: WhatsApp +91 9820466726
 
-# Enhanced chat input with supportive placeholder
-user_input = st.chat_input("Share what's on your mind... I'm here to listen 💙")
-
-# Process user input
-if user_input or (st.session_state.chat_history and not st.session_state.conversation_started):
-    if user_input:
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
-    
-    st.session_state.conversation_started = True
-    
-    # Get the most recent user message
-    latest_user_message = st.session_state.chat_history[-1]["content"]
-    
-    # Enhanced loading indicator
-    with st.spinner("💭 Thinking carefully about your message and preparing a thoughtful response..."):
-        response_content, tool_used, status = get_ai_response(latest_user_message)
-    
-    # Enhanced response formatting
-    if tool_used == "crisis_intervention":
-        st.markdown('<div class="crisis-alert">', unsafe_allow_html=True)
-        st.error("🚨 **Crisis Support Activated** - Please see the important resources below.")
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    st.session_state.chat_history.append({
-        "role": "assistant", 
-        "content": response_content,
-        "tool": tool_used,
-        "timestamp": datetime.now().strftime("%H:%M"),
-        "status": status
-    })
-    
-    st.rerun()
+**🌍 International:**
+- **US**: 988 (Suicide & Crisis Lifeline)
+- **UK**: 116 123 (Samaritans)
+- **Crisis Text Line**: Text HOME to 741741
+"""
+
+SIDEBAR_COPING_TOOLS = """
+**🫁 Breathing:**
+- 4-7-8 technique: In for 4, hold for 7, out for 8
+- Box breathing: 4-4-4-4 pattern
+
+**🧘 Grounding (5-4-3-2-1):**
+- 5 things you can see
+- 4 things you can hear
+- 3 things you can touch
+- 2 things you can smell
+- 1 thing you can taste
+
+**🚶 Movement:**
+- Take a 5-minute walk
+- Gentle stretching
+- Dance to one song
+"""
+
+SIDEBAR_HELPFUL_APPS = """
+- **Headspace** - Meditation & mindfulness
+- **Calm** - Sleep stories & relaxation
+- **Insight Timer** - Free meditation
+- **Youper** - Mood tracking
+- **Sanvelo** - Anxiety & mood support
+"""
+
+SIDEBAR_ABOUT = """
+SafeSpace provides:
+- 24/7 emotional support
+- Crisis detection & resources
+- Coping strategy suggestions
+- Non-judgmental listening
+- Connection to professional help
+
+**Important**: This tool complements but doesn't replace professional mental health care.
+"""
+
+# The whole sidebar as one markdown element, sections split by rules (Indian resources first)
+SIDEBAR_MARKDOWN = "\n\n---\n\n".join(
+    f"### {title}\n{body}"
+    for title, body in (
+        ("🆘 Crisis Resources", SIDEBAR_CRISIS_RESOURCES),
+        ("💡 Quick Coping Tools", SIDEBAR_COPING_TOOLS),
+        ("📱 Helpful Apps", SIDEBAR_HELPFUL_APPS),
+        ("ℹ️ About SafeSpace", SIDEBAR_ABOUT),
+    )
+)
 
-# Enhanced chat display
-if st.session_state.chat_history:
-    st.markdown("### 💬 Our Conversation")
-    
-    for i, msg in enumerate(st.session_state.chat_history):
-        with st.chat_message(msg["role"]):
-            # Special handling for crisis messages
-            if msg["role"] == "assistant" and msg.get("tool") == "crisis_intervention":
-                st.error(msg["content"])
-            else:
-                st.markdown(msg["content"])
-            
-            # Enhanced timestamp and status for assistant messages
-            if msg["role"] == "assistant" and "timestamp" in msg:
-                status_emoji = "✅" if msg.get("status") == "success" else "🔄"
-                st.caption(f"{status_emoji} Responded at {msg['timestamp']} • Tool: {msg.get('tool', 'unknown')}")
-    
-    # Enhanced action buttons
-    st.markdown("---")
-    st.markdown("### 🛠️ Quick Actions")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        if st.button("🔄 Fresh Start", help="Clear conversation and start over"):
-            st.session_state.chat_history = []
-            st.session_state.conversation_started = False
-            st.success("Conversation cleared. You can start fresh anytime you need to.")
-            st.rerun()
-    
-    with col2:
-        if st.button("📋 Resources", help="Get comprehensive mental health resources"):
-            resources_content = """🏥 **Comprehensive Mental Health Resources**
+RESOURCES_CONTENT = """🏥 **Comprehensive Mental Health Resources**
 
 **🆘 Crisis Support (India):**
 • AASRA: 9152987821 (24/7, suicide prevention)
@@ -659,18 +872,8 @@ if st.session_state.chat_history:
 • Local mental health organizations
 
 Remember: Professional help is always available when you need it. You deserve support and care. 💙"""
-            
-            st.session_state.chat_history.append({
-                "role": "assistant",
-                "content": resources_content,
-                "tool": "comprehensive_resources",
-                "timestamp": datetime.now().strftime("%H:%M")
-            })
-            st.rerun()
-    
-    with col3:
-        if st.button("💙 Self-Care", help="Get personalized self-care suggestions"):
-            selfcare_content = """🌱 **Self-Care Toolkit**
+
+SELFCARE_CONTENT = """🌱 **Self-Care Toolkit**
 
 **🏃 Physical Self-Care:**
 • Take a 10-minute walk in fresh air
@@ -721,18 +924,8 @@ Remember: Professional help is always available when you need it. You deserve su
 • Minimize clutter
 
 Remember: Self-care isn't selfish - it's necessary. Start small and be gentle with yourself. 💚"""
-            
-            st.session_state.chat_history.append({
-                "role": "assistant",
-                "content": selfcare_content,
-                "tool": "self_care_toolkit",
-                "timestamp": datetime.now().strftime("%H:%M")
-            })
-            st.rerun()
-    
-    with col4:
-        if st.button("🧘 Mindfulness", help="Get guided mindfulness exercises"):
-            mindfulness_content = """🧘 **Mindfulness & Grounding Exercises**
+
+MINDFULNESS_CONTENT = """🧘 **Mindfulness & Grounding Exercises**
 
 **🫁 Breathing Techniques:**
 
@@ -780,61 +973,144 @@ Remember: Self-care isn't selfish - it's necessary. Start small and be gentle wi
 • Thoughts are temporary visitors, not facts
 
 Practice these daily, even for just 2-3 minutes. Regular practice builds your mindfulness muscle! 🌱"""
-            
-            st.session_state.chat_history.append({
-                "role": "assistant",
-                "content": mindfulness_content,
-                "tool": "mindfulness_exercises",
-                "timestamp": datetime.now().strftime("%H:%M")
-            })
-            st.rerun()
-
-# Enhanced footer with comprehensive information
-st.markdown("---")
-st.markdown("### 📋 Important Information")
 
-# Create columns for organized information
-info_col1, info_col2 = st.columns(2)
+# =============================================================================
+# STREAMLIT FRONTEND
+# =============================================================================
 
-with info_col1:
-    st.markdown("""
-    **🔒 Privacy & Confidentiality:**
-    • Your conversations are processed locally
-    • No personal information is stored permanently
-    • Messages are not logged or saved after sessions
-    • This is a safe space for open communication
-    """)
+# Enhanced CSS for better visual experience. Sent on every run on purpose: Streamlit
+# drops any element a rerun doesn't re-emit, so skipping it would unstyle the page
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
-with info_col2:
-    st.markdown("""
-    **⚠️ Important Disclaimers:**
-    • SafeSpace is an AI support tool, not a medical device
-    • This is not a substitute for professional mental health treatment
-    • In crisis situations, please contact emergency services immediately
-    • Consider professional therapy for ongoing support
-    """)
+# Global graph instance, built once per server process and shared by every session
+graph = get_graph()
 
-# Technical information
-st.markdown("---")
-technical_col1, technical_col2 = st.columns(2)
-
-with technical_col1:
-    st.markdown(f"""
-    **🤖 Technical Status:**
-    • AI Mode: {'Enhanced' if api_available else 'Safe Mode (Rule-based)'}
-    • Response Quality: {'AI + Rule-based' if api_available else 'Advanced Rule-based'}
-    • Crisis Detection: ✅ Active
-    • Emotion Recognition: ✅ Active
-    """)
+# Validate API setup on startup
+api_available = validate_api_setup()
 
-with technical_col2:
-    st.markdown("""
-    **💡 How to Get Help:**
-    • Use the quick-start buttons above
-    • Type your thoughts in the chat box
-    • Access resources from the sidebar
-    • Contact professionals for ongoing support
+# Enhanced header
+st.title("🧠 SafeSpace — AI Mental Health Support")
+st.markdown("### *A safe, confidential space to express your feelings and find support*")
+
+# Removed the main page Safe Mode info message
+
+# Enhanced sidebar with more comprehensive resources
+with st.sidebar:
+    st.markdown(SIDEBAR_MARKDOWN)
+
+# Initialize enhanced session state (user_msg_count is kept in step with the user
+# entries in chat_history)
+for key, default in (
+    ("chat_history", []),
+    ("user_name", ""),
+    ("pending_response", None),
+    ("user_msg_count", 0),
+    ("show_older_messages", False),
+):
+    st.session_state.setdefault(key, default)
+
+# Enhanced welcome message and quick start section, shown until the first message.
+# Buttons and the chat box submit through callbacks, so the new turn is already in
+# session state when this run draws the page
+if not st.session_state.chat_history:
+    st.success("""
+    🌟 **Welcome to SafeSpace**
+    
+    This is your safe, confidential space to express thoughts and feelings. I'm here to listen 
+    without judgment and provide support whenever you need it.
+    
+    **You can:**
+    - Share what's on your mind
+    - Talk about your feelings
+    - Get coping strategies
+    - Access mental health resources
+    
+    **Remember:** If you're in crisis, please use the emergency resources in the sidebar immediately.
     """)
+    
+    st.markdown("### 💭 How are you feeling today?\n*Choose a button below to get started, or type your own message*")
+    
+    # Two rows of four, split by a rule
+    for row_start in range(0, len(QUICK_START_OPTIONS), 4):
+        if row_start:
+            st.markdown("---")
+        row = QUICK_START_OPTIONS[row_start:row_start + 4]
+        for col, (label, help_text, prompt) in zip(st.columns(4), row):
+            with col:
+                st.button(label, help=help_text, on_click=submit_user_message, args=(prompt,))
+
+# Enhanced chat input with supportive placeholder
+st.chat_input(
+    "Share what's on your mind... I'm here to listen 💙",
+    key="chat_input",
+    on_submit=submit_chat_input,
+    disabled=st.session_state.pending_response is not None
+)
+
+# Long conversations only render their latest messages unless the user asks for more
+VISIBLE_MESSAGES = 20
+
+# Enhanced chat display
+if st.session_state.chat_history:
+    st.markdown("### 💬 Our Conversation")
+    
+    older = st.session_state.chat_history[:-VISIBLE_MESSAGES]
+    if older:
+        # Mirrored into plain state: runs that st.rerun() before reaching the toggle
+        # would otherwise drop its widget value
+        st.session_state.show_older_messages = st.toggle(
+            "Show earlier messages",
+            value=st.session_state.show_older_messages
+        )
+        if st.session_state.show_older_messages:
+            for msg in older:
+                render_chat_message(msg)
+    
+    for msg in st.session_state.chat_history[-VISIBLE_MESSAGES:]:
+        render_chat_message(msg)
+    
+    # Quick-action replies are painted here in the same run they're requested
+    live_messages = st.container()
+    
+    # Reply still being generated in the background
+    if st.session_state.pending_response is not None:
+        render_pending_response()
+    
+    # Enhanced action buttons
+    st.markdown("---")
+    st.markdown("### 🛠️ Quick Actions")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.button("🔄 Fresh Start", help="Clear conversation and start over", on_click=reset_conversation)
+    
+    with col2:
+        if st.button("📋 Resources", help="Get comprehensive mental health resources"):
+            add_quick_action_reply(live_messages, RESOURCES_CONTENT, "comprehensive_resources")
+    
+    with col3:
+        if st.button("💙 Self-Care", help="Get personalized self-care suggestions"):
+            add_quick_action_reply(live_messages, SELFCARE_CONTENT, "self_care_toolkit")
+    
+    with col4:
+        if st.button("🧘 Mindfulness", help="Get guided mindfulness exercises"):
+            add_quick_action_reply(live_messages, MINDFULNESS_CONTENT, "mindfulness_exercises")
+
+# Enhanced footer with comprehensive information - one markdown per column, each
+# stacking its two sections
+st.markdown("---\n### 📋 Important Information")
+
+info_col1, info_col2 = st.columns(2)
+
+with info_col1:
+    st.markdown(FOOTER_LEFT_MARKDOWN.format(
+        ai_mode='Enhanced' if api_available else 'Safe Mode (Rule-based)',
+        response_quality='AI + Rule-based' if api_available else 'Advanced Rule-based'
+    ))
+
+with info_col2:
+    st.markdown(FOOTER_RIGHT_MARKDOWN)
 
 # Final disclaimer and support information
 st.markdown("---")
@@ -852,5 +1128,5 @@ part is taking that first step to reach out.
 
 # Usage statistics (if desired)
 if st.session_state.chat_history:
-    message_count = len([msg for msg in st.session_state.chat_history if msg["role"] == "user"])
+    message_count = st.session_state.user_msg_count
     st.caption(f"💬 You've shared {message_count} message{'s' if message_count != 1 else ''} in this session. Thank you for trusting SafeSpace with your thoughts and feelings.")